@@ -0,0 +1,13 @@
+# gunicorn.conf.py - production server settings (used by the Procfile)
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+
+# Import src.api (and load the model) once in the master before forking, so workers
+# share the model pages copy-on-write instead of each re-reading the pickle.
+preload_app = True
+
+workers = int(os.getenv("WEB_CONCURRENCY", 4))
+# threaded workers let requests blocked on WHOIS/DNS/TLS overlap within a worker
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", 8))
@@ -32,6 +32,30 @@ export default function App() {
   };
 
   const API_URL = import.meta.env.VITE_API_URL;
+  const EXPLAIN_URL = API_URL?.replace(/\/predict\/?$/, "/explain");
+
+  // SHAP explanations are computed in the background; swap them in when ready
+  const pollExplanation = async (token, attempts = 20) => {
+    for (let i = 0; i < attempts; i++) {
+      await new Promise((r) => setTimeout(r, 500));
+      try {
+        const res = await fetch(`${EXPLAIN_URL}/${token}`);
+        if (res.status === 202) continue;
+        if (!res.ok) return;
+        const data = await res.json();
+        if (data.top_contributions?.length > 0) {
+          setResult((prev) =>
+            prev?.explanation_token === token
+              ? { ...prev, top_contributions: data.top_contributions }
+              : prev
+          );
+        }
+        return;
+      } catch {
+        return;
+      }
+    }
+  };
 
   const handleScan = async () => {
     if (!url.trim()) return;
@@ -50,6 +74,7 @@ export default function App() {
       if (!res.ok) throw new Error(data.error || "Scan failed");
 
       setResult(data);
+      if (data.explanation_token) pollExplanation(data.explanation_token);
 
       setHistory((prev) => [
         {
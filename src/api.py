@@ -1,21 +1,80 @@
 # src/api.py (WHOIS-enabled, CORS, API-key, rate-limited) - with SHAP fallback to feature_importances_
 import os
+import atexit
+import contextlib
 import time
+import functools
 import sys
-import traceback
-import joblib
-import pandas as pd
-
-from flask import Flask, request, jsonify, abort
+import logging
+import queue
+import threading
+import uuid
+import warnings
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor
+from logging.handlers import QueueHandler, QueueListener
+from urllib.parse import urlsplit
+import numpy as np
+from cachetools import TTLCache
+import orjson
+
+from flask import Flask, request, abort
+from flask.json.provider import JSONProvider
 from flask_cors import CORS
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 
-print("DEBUG: starting api.py")
+# ---------------- Logging ----------------
+# Records go onto an in-process queue and are formatted/written to stdout by a
+# listener thread, so request threads never format tracebacks or block on stdout.
+class _LazyQueueHandler(QueueHandler):
+    def prepare(self, record):
+        # same process: pass the record through untouched, the listener formats it
+        return record
+
+logger = logging.getLogger("phishguard")
+logger.setLevel(logging.INFO)
+logger.propagate = False
+_log_handler = _LazyQueueHandler(queue.SimpleQueue())
+logger.addHandler(_log_handler)
+_log_listener = None
+
+def _start_log_listener():
+    global _log_listener
+    # fresh queue: the parent's may have been mid-operation when the process forked
+    _log_handler.queue = queue.SimpleQueue()
+    _log_listener = QueueListener(_log_handler.queue, logging.StreamHandler(sys.stdout))
+    _log_listener.start()
+
+_start_log_listener()
+# No listener thread may be running while Gunicorn's preloaded master forks: one caught
+# inside a stdout write would leave the child a held buffer lock. Stop it (flushing
+# the queue) before fork, resume it in the parent and start a fresh one in the child.
+os.register_at_fork(before=lambda: _log_listener.stop(),
+                    after_in_parent=lambda: _log_listener.start(),
+                    after_in_child=_start_log_listener)
+atexit.register(lambda: _log_listener.stop())
 
 def log(msg):
-    print(msg)
-    sys.stdout.flush()
+    logger.info(msg)
+
+# Repeated identical failures (e.g. malformed input hammering an endpoint) only get a
+# full traceback on the first occurrence and every EXC_LOG_EVERY-th one after that.
+EXC_LOG_EVERY = 100
+_exc_counts = Counter()
+
+def log_exception(msg):
+    """Log msg with the current exception, sampling tracebacks per exception type."""
+    exc_type = sys.exc_info()[0]
+    name = exc_type.__name__ if exc_type else "Exception"
+    _exc_counts[name] += 1
+    n = _exc_counts[name]
+    if n == 1 or n % EXC_LOG_EVERY == 0:
+        logger.exception(f"{msg} ({name}, seen {n}x)")
+    else:
+        logger.warning(f"{msg} ({name}, seen {n}x; traceback suppressed)")
+
+log("DEBUG: starting api.py")
 
 # ---------------- Ensure local src directory is on Python path ----------------
 # This makes imports like "import kaggle_features" work even if the app is started
@@ -32,8 +91,7 @@ try:
         sys.path.insert(0, REPO_ROOT)
     log(f"DEBUG: added to sys.path: {THIS_DIR} and {REPO_ROOT}")
 except Exception:
-    log("WARN: failed to adjust sys.path for local imports")
-    traceback.print_exc()
+    log_exception("WARN: failed to adjust sys.path for local imports")
 
 # ---------------- Flask app ----------------
 app = Flask(__name__)
@@ -46,10 +104,15 @@ CORS(app, resources={r"/*": {"origins": FRONTEND_ORIGIN}},
      allow_headers=["Content-Type", "x-api-key", "Authorization", "X-Requested-With"])
 
 # Rate limiter (per-IP). Adjust limits as needed.
-# Flask-Limiter v3+ syntax
+# Flask-Limiter v3+ syntax. strategy="fixed-window" is the library default, spelled
+# out here; set RATELIMIT_STORAGE_URI (e.g. redis://localhost:6379) to share counters
+# across Gunicorn workers instead of keeping them per process in memory.
+RATELIMIT_STORAGE_URI = os.getenv("RATELIMIT_STORAGE_URI", "memory://")
 limiter = Limiter(
     key_func=get_remote_address,
-    default_limits=["60 per minute"]
+    default_limits=["60 per minute"],
+    strategy="fixed-window",
+    storage_uri=RATELIMIT_STORAGE_URI
 )
 limiter.init_app(app)
 
@@ -64,69 +127,566 @@ def require_api_key():
         if not key or key != API_KEY:
             abort(401, description="Unauthorized (missing or invalid API key)")
 
-@app.after_request
-def set_secure_headers(response):
-    # Basic secure headers
-    response.headers.setdefault('Strict-Transport-Security', 'max-age=31536000; includeSubDomains')
-    response.headers.setdefault('X-Content-Type-Options', 'nosniff')
-    response.headers.setdefault('X-Frame-Options', 'DENY')
-    return response
+# Basic secure headers, appended at the WSGI layer instead of a Flask after_request hook
+SECURE_HEADERS = (
+    ('Strict-Transport-Security', 'max-age=31536000; includeSubDomains'),
+    ('X-Content-Type-Options', 'nosniff'),
+    ('X-Frame-Options', 'DENY'),
+)
+
+class SecureHeadersMiddleware:
+    """WSGI wrapper adding SECURE_HEADERS to every response that does not set them."""
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+
+    def __call__(self, environ, start_response):
+        def _start_response(status, headers, exc_info=None):
+            present = {k.lower() for k, _ in headers}
+            headers.extend(h for h in SECURE_HEADERS if h[0].lower() not in present)
+            return start_response(status, headers, exc_info)
+        return self.wsgi_app(environ, _start_response)
+
+app.wsgi_app = SecureHeadersMiddleware(app.wsgi_app)
+
+class OrjsonProvider(JSONProvider):
+    """Flask JSON provider backed by orjson, so jsonify() and request.get_json() use it too."""
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+app.json = OrjsonProvider(app)
+
+def ojson(obj, status=200):
+    """JSON response encoded with orjson (numpy scalars/arrays serialized natively)."""
+    return app.response_class(orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY),
+                              status=status, mimetype='application/json')
 
 # ---------------- Load Kaggle columns & model ----------------
+# Heavy imports (joblib/sklearn, pandas, shap) and the model load live in
+# _ensure_loaded(). It runs at import by default, so Gunicorn's preload shares the
+# model with workers; with LAZY_LOAD=1 it is deferred to the first request that needs
+# it, so the process (and '/', '/health') come up without paying for it.
+LAZY_LOAD = os.getenv("LAZY_LOAD", "0") == "1"
+
 expected_cols = None
 label_col = None
-
-# Import feature extractor safely and report clear error if fails
-try:
-    from kaggle_features import load_kaggle_columns, extract_kaggle_features
-    log("DEBUG: imported kaggle_features")
-    # attempt to load the CSV from repo root/data/raw/kaggle_phish.csv
+load_kaggle_columns = None
+extract_kaggle_features = None
+model = None
+onnx_session = None
+onnx_input_name = None
+tl_predictor = None
+tl2cgen = None
+explain_instance = None
+joblib = None
+pd = None
+_sanitize = None
+COL_INDEX = {}
+_build_row = None
+ROWS_BATCHED = False
+TOPK_CONTRIBS = None
+_sk_fast = contextlib.nullcontext
+_LOADED = False
+_LOAD_LOCK = threading.Lock()
+
+# Resolve model path robustly relative to repo root; MODEL_PATH / KAGGLE_CSV env vars
+# point a deployment at a different model or dataset without editing this file.
+# Everything exported alongside the model (ONNX, compiled library, column list) is
+# looked up next to MODEL_PATH and named after it, so an override never mixes one
+# model's labels with another model's exports.
+MODEL_FILENAME = "phish_model_kaggle.pkl"
+MODEL_PATH = os.path.abspath(os.getenv("MODEL_PATH") or os.path.join(REPO_ROOT, "models", MODEL_FILENAME))
+MODEL_DIR = os.path.dirname(MODEL_PATH)
+MODEL_STEM = os.path.splitext(MODEL_PATH)[0]
+COLUMNS_JSON = os.path.join(MODEL_DIR, "expected_cols.json")
+KAGGLE_CSV_ENV = os.getenv("KAGGLE_CSV")
+KAGGLE_CSV = os.path.abspath(KAGGLE_CSV_ENV or os.path.join(REPO_ROOT, "data", "raw", "kaggle_phish.csv"))
+
+@functools.lru_cache(maxsize=1)
+def _get_model():
+    """Load the model once per process (from _ensure_loaded, normally before Gunicorn forks)."""
+    log(f"DEBUG: loading model from {MODEL_PATH} ...")
+    start = time.time()
+    if not os.path.exists(MODEL_PATH):
+        raise FileNotFoundError(f"Model file not found at {MODEL_PATH}")
+    # mmap_mode='r' only keeps plain ndarray attributes (e.g. classes_) mapped: sklearn's
+    # Tree.__setstate__ copies the node arrays onto the heap, so it saves no memory for
+    # the forest itself. Sharing between workers comes from loading here, in the
+    # preloaded Gunicorn master, and forking (copy-on-write pages).
+    # Requires an uncompressed dump (train_kaggle.py saves with compress=0).
+    loaded = joblib.load(MODEL_PATH, mmap_mode='r')
+    log(f"DEBUG: model loaded in {time.time()-start:.2f}s")
+    return loaded
+
+# Optional ONNX Runtime session (generate with export_model.py); the sklearn model
+# above remains the fallback when the .onnx file or onnxruntime is missing
+ONNX_PATH = MODEL_STEM + ".onnx"
+
+# Optional treelite/tl2cgen compiled predictor (python export_model.py treelite); it is
+# preferred over ONNX and the sklearn model when the shared library loads
+TREELITE_LIB_PATH = MODEL_STEM + ".so"
+
+# ---------------- Preallocated feature row ----------------
+# Primary path: COL_INDEX (column name -> position, built once by _ensure_loaded) lets
+# predict() fill a reusable float32 row in place instead of building a one-row
+# DataFrame per request. _build_without_cols is only the fallback for a deployment
+# without a column list. One buffer per thread so concurrent requests in a threaded
+# worker never share a row.
+_ROW_LOCAL = threading.local()
+
+def _feature_row(feats):
+    """Pack a feature dict into the thread's (1, n_features) float32 buffer."""
+    buf = getattr(_ROW_LOCAL, "buf", None)
+    if buf is None:
+        buf = np.zeros((1, len(expected_cols)), dtype=np.float32)
+        _ROW_LOCAL.buf = buf
+    if list(feats) == expected_cols:
+        # extractor output already in model column order (the normal case): one C-level
+        # assignment does the reindex; None becomes NaN and is zeroed below
+        buf[0] = list(feats.values())
+    else:
+        buf.fill(0)
+        for k, v in feats.items():
+            i = COL_INDEX.get(k)
+            if i is not None:
+                buf[0, i] = v
+    # safe numeric defaults (same as fillna(0) + replace(-1, 0))
+    _sanitize(buf[0])
+    return buf
+
+def _build_with_cols(cols):
+    """Row builder for a known column list: fills the preallocated float32 row."""
+    def build(feats):
+        return _feature_row(feats), cols
+    return build
+
+def _build_without_cols(feats):
+    """Fallback row builder when no column list is available: goes through a DataFrame."""
+    df = pd.DataFrame([feats])
+    # safe numeric defaults in one in-place pass (instead of fillna + replace copies)
+    X = df.to_numpy(dtype=np.float64)
+    np.nan_to_num(X, copy=False, nan=0.0)
+    np.putmask(X, X == -1, 0)
+    return X, list(df.columns)
+
+def _load_columns():
+    global expected_cols, label_col, load_kaggle_columns, extract_kaggle_features
+    # Import feature extractor safely and report clear error if fails
     try:
-        kaggle_csv_path = os.path.abspath(os.path.join(REPO_ROOT, "data", "raw", "kaggle_phish.csv"))
-        if os.path.exists(kaggle_csv_path):
-            expected_cols, label_col = load_kaggle_columns(kaggle_csv_path)
-            log(f"API: expecting features: {len(expected_cols) if expected_cols else 0} features (loaded from {kaggle_csv_path})")
-        else:
-            log(f"WARN: kaggle CSV not found at {kaggle_csv_path}; load_kaggle_columns was not called.")
+        from kaggle_features import load_kaggle_columns, load_saved_columns, extract_kaggle_features
+        log("DEBUG: imported kaggle_features")
+        # an explicit KAGGLE_CSV wins; otherwise prefer the column list exported next to
+        # the model (expected_cols.json) and fall back to the default dataset's header
+        try:
+            cols_json_path = COLUMNS_JSON
+            kaggle_csv_path = KAGGLE_CSV
+            if KAGGLE_CSV_ENV and os.path.exists(kaggle_csv_path):
+                expected_cols, label_col = load_kaggle_columns(kaggle_csv_path)
+                log(f"API: expecting features: {len(expected_cols) if expected_cols else 0} features (loaded from {kaggle_csv_path})")
+            elif os.path.exists(cols_json_path):
+                expected_cols, label_col = load_saved_columns(cols_json_path)
+                log(f"API: expecting features: {len(expected_cols) if expected_cols else 0} features (loaded from {cols_json_path})")
+            elif os.path.exists(kaggle_csv_path):
+                expected_cols, label_col = load_kaggle_columns(kaggle_csv_path)
+                log(f"API: expecting features: {len(expected_cols) if expected_cols else 0} features (loaded from {kaggle_csv_path})")
+            else:
+                log(f"WARN: neither {cols_json_path} nor {kaggle_csv_path} found; load_kaggle_columns was not called.")
+                expected_cols = None
+                label_col = None
+        except Exception:
+            log_exception("WARN: failed to load kaggle columns; continuing with None.")
             expected_cols = None
             label_col = None
     except Exception:
-        log("WARN: failed to load kaggle CSV columns; continuing with None.")
-        traceback.print_exc()
+        log_exception("ERROR: runtime import of kaggle_features failed")
+        # keep the names defined but set to None so predict() can return a helpful error
+        load_kaggle_columns = None
+        extract_kaggle_features = None
         expected_cols = None
         label_col = None
-except Exception:
-    log("ERROR: runtime import of kaggle_features failed")
-    traceback.print_exc()
-    # keep the names defined but set to None so predict() can return a helpful error
-    load_kaggle_columns = None
-    extract_kaggle_features = None
-    expected_cols = None
-    label_col = None
-
-# Resolve model path robustly relative to repo root
-MODEL_FILENAME = "phish_model_kaggle.pkl"
-MODEL_PATH = os.path.abspath(os.path.join(REPO_ROOT, "models", MODEL_FILENAME))
-model = None
-try:
-    log(f"DEBUG: loading model from {MODEL_PATH} ...")
+
+def _load_model_backends():
+    global joblib, model, onnx_session, onnx_input_name, tl_predictor, tl2cgen, _sk_fast
+    import joblib
+
+    # The request path feeds sklearn raw float32 rows (no DataFrame): skip its finiteness
+    # scan (rows are sanitized before predict) and the feature-name mismatch warning.
+    # sklearn's config is thread-local, so the predict calls (batcher thread, request
+    # threads) each enter this context rather than relying on a set_config here.
+    try:
+        from sklearn import config_context
+        _sk_fast = functools.partial(config_context, assume_finite=True)
+    except Exception:
+        log("WARN: could not configure sklearn (assume_finite)")
+    warnings.filterwarnings('ignore', message='X does not have valid feature names')
+
+    try:
+        model = _get_model()
+    except Exception:
+        log_exception("ERROR loading model")
+        model = None
+
+    try:
+        if os.path.exists(ONNX_PATH):
+            import onnxruntime as ort
+            onnx_session = ort.InferenceSession(ONNX_PATH, providers=['CPUExecutionProvider'])
+            onnx_input_name = onnx_session.get_inputs()[0].name
+            log(f"DEBUG: ONNX session loaded from {ONNX_PATH}")
+    except Exception:
+        log_exception("WARN: failed to load ONNX model; using sklearn predict")
+        onnx_session = None
+
+    try:
+        if os.path.exists(TREELITE_LIB_PATH):
+            import tl2cgen
+            tl_predictor = tl2cgen.Predictor(TREELITE_LIB_PATH)
+            log(f"DEBUG: compiled predictor loaded from {TREELITE_LIB_PATH}")
+    except Exception:
+        log_exception("WARN: failed to load compiled predictor; using ONNX/sklearn predict")
+        tl_predictor = None
+
+def importance_contributions(cols, k=6):
+    """Top-k {feature, contribution} pairs from model.feature_importances_ (by magnitude)."""
+    fi = getattr(model, "feature_importances_", None)
+    if fi is None:
+        return []
+    cols = list(cols)
+    fi = np.asarray(fi, dtype=float)[:len(cols)]
+    top = np.argsort(-np.abs(fi), kind="stable")[:k]
+    return [{"feature": cols[i], "contribution": float(fi[i])} for i in top]
+
+def _ensure_loaded():
+    """Import heavy dependencies, load columns/model/backends once (thread-safe)."""
+    global _LOADED, pd, _sanitize, COL_INDEX, _build_row, ROWS_BATCHED, TOPK_CONTRIBS, explain_instance
+    if _LOADED:
+        return
+    with _LOAD_LOCK:
+        if _LOADED:
+            return
+        import pandas as pd
+        _load_columns()
+        _load_model_backends()
+
+        # numba-compiled NaN/-1 fixup for the row (NumPy fallback without numba);
+        # compile (or load from the on-disk cache) now so forked workers inherit it
+        from row_kernels import sanitize_row as _sanitize
+        _sanitize(np.zeros(1, dtype=np.float32))
+
+        # Column name -> position in the model input (see _feature_row)
+        COL_INDEX = {c: i for i, c in enumerate(expected_cols)} if expected_cols else {}
+        # expected_cols never changes after startup, so resolve the builder once here
+        _build_row = _build_with_cols(expected_cols) if expected_cols else _build_without_cols
+        # only fixed-width rows can be stacked by the micro-batcher
+        ROWS_BATCHED = bool(expected_cols)
+        n_model = getattr(model, "n_features_in_", None)
+        if expected_cols and n_model is not None and n_model != len(expected_cols):
+            log(f"WARN: model expects {n_model} features but the column list has {len(expected_cols)}; "
+                "predictions will fail until they match")
+        if model is not None and not hasattr(model, "predict_proba"):
+            log("WARN: predict_proba not available; continuing without confidence")
+        # feature importances never change, so /predict's immediate contributions (the 6
+        # entries it returns) don't either
+        TOPK_CONTRIBS = importance_contributions(expected_cols) if expected_cols and model is not None else None
+
+        # Optional SHAP explain util; it reuses the model loaded above and builds its
+        # TreeExplainer here, once, instead of on every explanation
+        try:
+            from shap_utils import explain_instance, set_model as _set_explain_model
+            if model is not None:
+                _set_explain_model(model)
+            log("DEBUG: shap_utils imported")
+        except Exception:
+            explain_instance = None
+            log("DEBUG: shap_utils not available; explanations disabled")
+
+        _warmup()
+        _LOADED = True
+
+# ---------------- Scoring & micro-batching ----------------
+from micro_batch import MicroBatcher
+
+def _score_sklearn(X):
+    """Score X with the sklearn model; confidence is None when it has no predict_proba."""
+    with _sk_fast():
+        if not hasattr(model, "predict_proba"):
+            return [(int(l), None) for l in np.ravel(model.predict(X))]
+        # one forest walk: predict() is classes_[argmax(predict_proba)], so derive
+        # the label from the probabilities instead of calling both
+        proba = model.predict_proba(X)
+    labels = model.classes_[np.argmax(proba, axis=1)]
+    return [(int(l), float(p)) for l, p in zip(labels, proba.max(axis=1))]
+
+def score_rows(X):
+    """Score an (N, F) float32 array; returns a list of (label, confidence) per row."""
+    if tl_predictor is not None:
+        # compiled forest; binary models may come back as (N, 1, 2) or as P(class 1)
+        proba = tl_predictor.predict(tl2cgen.DMatrix(X)).reshape(len(X), -1)
+        if proba.shape[1] == 1:
+            proba = np.hstack([1.0 - proba, proba])
+        labels = model.classes_[np.argmax(proba, axis=1)]
+    elif onnx_session is not None:
+        # one native call returns both the labels and the class probabilities
+        labels, proba = onnx_session.run(None, {onnx_input_name: X})
+    else:
+        return _score_sklearn(X)
+    return [(int(l), float(p)) for l, p in zip(labels, proba.max(axis=1))]
+
+# single-row requests park here for up to BATCH_TIMEOUT_MS and share one model call;
+# a lone request is scored at once. A batch never holds more rows than the worker has
+# request threads, so MAX_BATCH_SIZE defaults to GUNICORN_THREADS (gunicorn.conf.py);
+# MAX_BATCH_SIZE=1 disables coalescing.
+MAX_BATCH_SIZE = max(1, int(os.getenv("MAX_BATCH_SIZE") or os.getenv("GUNICORN_THREADS", "8")))
+BATCH_TIMEOUT_MS = float(os.getenv("BATCH_TIMEOUT_MS", "15"))
+_BATCHER = MicroBatcher(score_rows, max_batch=MAX_BATCH_SIZE, max_wait=BATCH_TIMEOUT_MS / 1000.0)
+
+def _warmup():
+    """
+    Run one synthetic URL through extraction and scoring so the first real request does
+    not pay for lazy imports, the public-suffix load, JIT/cache loads and cold tree
+    pages. Network lookups and the micro-batcher are skipped: no threads are started,
+    which keeps the preloaded Gunicorn master fork-safe.
+    """
     start = time.time()
-    if not os.path.exists(MODEL_PATH):
-        raise FileNotFoundError(f"Model file not found at {MODEL_PATH}")
-    model = joblib.load(MODEL_PATH)
-    log(f"DEBUG: model loaded in {time.time()-start:.2f}s")
-except Exception:
-    log("ERROR loading model:")
-    traceback.print_exc()
-    model = None
+    try:
+        if extract_kaggle_features is not None:
+            extract_kaggle_features("http://warmup.example.com/index.html?a=1",
+                                    expected_columns=expected_cols, do_network=False)
+        if model is not None and expected_cols:
+            score_rows(np.zeros((1, len(expected_cols)), dtype=np.float32))
+        log(f"DEBUG: warmup done in {time.time()-start:.2f}s")
+    except Exception:
+        log_exception("WARN: warmup failed")
+
+if not LAZY_LOAD:
+    _ensure_loaded()
+
+# ---------------- Feature cache ----------------
+# Extraction (WHOIS/SSL/DNS) dominates /predict latency, so repeated URLs reuse the
+# previous result. Failures are remembered briefly so hostile inputs that trigger
+# network timeouts are not retried on every request. Features live shorter than the
+# response cache below; they are shared by /predict and /predict_batch.
+_FEAT_CACHE = TTLCache(maxsize=10_000, ttl=600)
+_FEAT_FAIL_CACHE = TTLCache(maxsize=10_000, ttl=300)
+_FEAT_LOCK = threading.Lock()
+
+def cached_features(url, do_whois):
+    """
+    extract_kaggle_features with a per-(url, do_whois) TTL cache; returns (feats, complete).
+    Features from an extraction whose network lookups did not all finish with a definite
+    answer (abandoned, or failed transiently such as a timeout) are returned but not
+    cached; the extractor's own failure caches hold those for FAIL_TTL.
+    """
+    key = (url, bool(do_whois))
+    with _FEAT_LOCK:
+        feats = _FEAT_CACHE.get(key)
+        err = _FEAT_FAIL_CACHE.get(key)
+    if feats is not None:
+        return feats, True
+    if err is not None:
+        raise err.with_traceback(None)
+    try:
+        feats, complete = extract_kaggle_features(url, expected_columns=expected_cols,
+                                                  do_whois=bool(do_whois), return_complete=True)
+    except Exception as e:
+        with _FEAT_LOCK:
+            _FEAT_FAIL_CACHE[key] = e
+        raise
+    if complete:
+        with _FEAT_LOCK:
+            _FEAT_CACHE[key] = feats
+    return feats, complete
+
+# ---------------- Response cache ----------------
+# Refreshes and re-scans resend the same URL; /predict answers those from the finished
+# response without touching the extractor or the model. Entries are dicts holding the
+# response, the scored row and, once SHAP finishes, its explanation, so an expired
+# explanation token is re-issued from the kept result instead of re-running SHAP.
+_RESPONSE_CACHE = TTLCache(maxsize=10_000, ttl=3600)
+_RESPONSE_LOCK = threading.Lock()
+
+def response_cache_key(url, do_whois):
+    """(normalized url, do_whois): surrounding whitespace dropped, scheme and host lowercased."""
+    url = url.strip()
+    try:
+        parts = urlsplit(url)
+        url = parts._replace(scheme=parts.scheme.lower(), netloc=parts.netloc.lower()).geturl()
+    except ValueError:
+        pass
+    return (url, bool(do_whois))
+
+# ---------------- Background explanations ----------------
+# SHAP costs hundreds of ms per row, so /predict only submits it and returns a token;
+# clients fetch the result from /explain/<token>.
+_EXPLAIN_EXECUTOR = ThreadPoolExecutor(max_workers=2)
+_EXPLAIN_RESULTS = TTLCache(maxsize=1024, ttl=300)
+_EXPLAIN_LOCK = threading.Lock()
+
+def _register_explanation(fut):
+    """Make fut fetchable from /explain/<token>; returns the new token."""
+    token = uuid.uuid4().hex
+    with _EXPLAIN_LOCK:
+        _EXPLAIN_RESULTS[token] = fut
+    return token
+
+def submit_explanation(row, feature_names):
+    """Queue explain_instance for a (1, F) row on the background pool; returns its token."""
+    fut = _EXPLAIN_EXECUTOR.submit(explain_instance, row, top_k=6, feature_names=feature_names)
+    return _register_explanation(fut)
+
+def _keep_explanation(entry, token):
+    """Store the explanation behind token in the response-cache entry once it finishes."""
+    with _EXPLAIN_LOCK:
+        fut = _EXPLAIN_RESULTS.get(token)
+    if fut is None:
+        return
+
+    def done(f):
+        if not f.cancelled() and f.exception() is None:
+            with _RESPONSE_LOCK:
+                entry['explanation'] = f.result()
+    fut.add_done_callback(done)
+
+# ---------------- Prediction ----------------
+def _renew_explanation(entry):
+    """
+    New explanation token for a cached entry whose token expired, written back into the
+    entry: re-issued from the kept explanation, or SHAP re-queued if it never finished.
+    """
+    requeued = False
+    with _RESPONSE_LOCK:
+        token = entry['response']['explanation_token']
+        with _EXPLAIN_LOCK:
+            alive = token in _EXPLAIN_RESULTS
+        if alive:
+            # a concurrent hit renewed it first
+            return token
+        try:
+            if entry['explanation'] is not None:
+                fut = Future()
+                fut.set_result(entry['explanation'])
+                token = _register_explanation(fut)
+            else:
+                token = submit_explanation(entry['row'], entry['feature_names'])
+                requeued = True
+        except Exception:
+            log_exception("WARN: failed to submit explain_instance")
+            token = None
+        entry['response'] = {**entry['response'], 'explanation_token': token}
+    if requeued:
+        _keep_explanation(entry, token)
+    return token
+
+def cached_response(cache_key, url):
+    """Cached /predict response for cache_key (renewing an expired explanation token), or None."""
+    with _RESPONSE_LOCK:
+        entry = _RESPONSE_CACHE.get(cache_key)
+        response = entry['response'] if entry is not None else None
+    if response is None:
+        return None
+    token = response['explanation_token']
+    if token is not None:
+        with _EXPLAIN_LOCK:
+            alive = token in _EXPLAIN_RESULTS
+        if not alive:
+            token = _renew_explanation(entry)
+    return {**response, 'url': url, 'explanation_token': token}
+
+def score_features(feats, explain=True):
+    """
+    Score one feature dict; returns (response without 'url', row, feature_names).
+    explain=False skips queuing the SHAP explanation (explanation_token is None).
+    """
+    # row builder was picked once at startup (preallocated row vs DataFrame fallback)
+    X, feature_names = _build_row(feats)
+
+    if ROWS_BATCHED:
+        # the row is coalesced with concurrent requests into one model call
+        try:
+            pred, prob = _BATCHER.submit(X[0].copy())
+        except TimeoutError:
+            log("WARN: micro-batch timed out; scoring row directly")
+            (pred, prob), = score_rows(X)
+    else:
+        # DataFrame fallback: its columns need not match a compiled/ONNX export
+        (pred, prob), = _score_sklearn(X)
+
+    label = "Phishing" if pred == 1 else "Legitimate"
+
+    # ---------------- Explain (if available) with fallback ----------------
+    contribs = []
+    explanation_token = None
+    # SHAP-based explanations (if shap_utils.explain_instance is available) run in the
+    # background; the client polls /explain/<token> for them
+    # copy the row: the buffer is reused by the next request on this thread
+    row = X.copy()
+    if explain and explain_instance:
+        try:
+            explanation_token = submit_explanation(row, feature_names)
+        except Exception:
+            log_exception("WARN: failed to submit explain_instance")
+            explanation_token = None
+
+    # Immediate contributions from model.feature_importances_: a static ranking,
+    # computed once at load for expected_cols
+    if TOPK_CONTRIBS is not None and feature_names is expected_cols:
+        contribs = TOPK_CONTRIBS
+    else:
+        try:
+            contribs = importance_contributions(feature_names)
+        except Exception:
+            log_exception("WARN: feature_importances_ fallback failed")
+
+    # If still empty, contribs will be empty list (frontend will show "No contributions")
+
+    response = {
+        'prediction': label,
+        'confidence': round(prob, 3) if prob is not None else None,
+        'top_contributions': contribs,
+        'explanation_token': explanation_token
+    }
+    return response, row, feature_names
+
+def full_prediction(url, do_whois, cache_key):
+    """
+    Full-feature /predict response for url (extraction + model + explanation); cached
+    unless a network lookup was abandoned or failed transiently.
+    """
+    # Extract features (do_whois flag can be toggled); cached per URL
+    feats, complete = cached_features(url, do_whois)
+    response, row, feature_names = score_features(feats)
+    response = {'url': url, **response}
+    if complete:
+        entry = {'response': response, 'row': row, 'feature_names': feature_names, 'explanation': None}
+        with _RESPONSE_LOCK:
+            _RESPONSE_CACHE[cache_key] = entry
+        if response['explanation_token'] is not None:
+            _keep_explanation(entry, response['explanation_token'])
+    return response
 
-# Optional SHAP explain util
-try:
-    from shap_utils import explain_instance
-    log("DEBUG: shap_utils imported")
-except Exception:
-    explain_instance = None
-    log("DEBUG: shap_utils not available; explanations disabled")
+# Two-stage predictions: /predict with "two_stage": true answers from lexical features
+# and leaves the network lookups to this pool; one job per cache key at a time
+_FULL_EXECUTOR = ThreadPoolExecutor(max_workers=4)
+_FULL_PENDING = {}
+_FULL_LOCK = threading.Lock()
+FULL_WAIT = float(os.getenv("FULL_PREDICT_WAIT", "5"))
+
+def submit_full_prediction(url, do_whois, cache_key):
+    """Start full_prediction in the background unless one is already running; returns its future."""
+    with _FULL_LOCK:
+        fut = _FULL_PENDING.get(cache_key)
+        if fut is not None:
+            return fut
+        fut = _FULL_EXECUTOR.submit(full_prediction, url, do_whois, cache_key)
+        _FULL_PENDING[cache_key] = fut
+    # outside the lock: the callback runs inline if the job has already finished
+    fut.add_done_callback(lambda _: _pop_pending(cache_key))
+    return fut
+
+def _pop_pending(cache_key):
+    with _FULL_LOCK:
+        _FULL_PENDING.pop(cache_key, None)
 
 # ---------------- Routes ----------------
 @app.route('/')
@@ -135,7 +695,7 @@ def home():
 
 @app.route('/health', methods=['GET'])
 def health():
-    return jsonify({
+    return ojson({
         "status": "ok",
         "model_loaded": bool(model),
         "feature_extractor_available": bool(extract_kaggle_features),
@@ -147,124 +707,181 @@ def health():
 def predict():
     # enforce API key if configured
     require_api_key()
+    _ensure_loaded()
 
     # quick checks
     if extract_kaggle_features is None:
-        return jsonify({'error': 'Feature extractor not available on server (kaggle_features import failed)'}), 500
+        return ojson({'error': 'Feature extractor not available on server (kaggle_features import failed)'}, 500)
     if model is None:
-        return jsonify({'error': 'Model not loaded'}), 500
+        return ojson({'error': 'Model not loaded'}, 500)
 
     try:
         data = request.get_json(force=True) or {}
+        if not isinstance(data, dict):
+            return ojson({'error': 'Request body must be a JSON object'}, 400)
         url = data.get('url', '') or ''
         do_whois = data.get('do_whois', True)
 
         if not url:
-            return jsonify({'error': 'No URL provided'}), 400
+            return ojson({'error': 'No URL provided'}, 400)
+        if not isinstance(url, str):
+            return ojson({'error': 'URL must be a string'}, 400)
 
-        # Extract features (do_whois flag can be toggled)
-        feats = extract_kaggle_features(url, expected_columns=expected_cols, do_whois=bool(do_whois))
+        cache_key = response_cache_key(url, do_whois)
+        response = cached_response(cache_key, url)
+        if response is not None:
+            return ojson(response, 200)
 
-        # Build DataFrame in expected column order (robustly)
-        # feats can be dict or list-like depending on your extractor; handle dict case
-        if isinstance(feats, dict):
-            df = pd.DataFrame([feats])
-        else:
-            # assume list-like
-            df = pd.DataFrame([feats])
+        if data.get('two_stage'):
+            # answer from the URL text alone now; the full result is computed in the
+            # background and served by /predict/full (or the next /predict) once ready
+            submit_full_prediction(url, do_whois, cache_key)
+            feats = extract_kaggle_features(url, expected_columns=expected_cols, do_whois=False, do_network=False)
+            response, _, _ = score_features(feats, explain=False)
+            return ojson({'url': url, **response, 'heavy_features_pending': True}, 200)
 
-        if expected_cols:
-            # Reindex to the expected columns, filling missing cols with zeros
-            df = df.reindex(columns=expected_cols, fill_value=0)
+        return ojson(full_prediction(url, do_whois, cache_key), 200)
 
-        # safe numeric defaults
-        df = df.fillna(0)
-        df = df.replace(-1, 0)
+    except Exception as e:
+        log_exception("ERROR in /predict")
+        return ojson({'error': str(e)}, 500)
 
-        # Predict - some models may not have predict_proba
-        pred_raw = model.predict(df)
-        try:
-            pred = int(pred_raw[0]) if hasattr(pred_raw, "__iter__") else int(pred_raw)
-        except Exception:
-            # fallback if predict returns something else
-            pred = int(pred_raw)
+@app.route('/predict/full', methods=['GET'])
+@limiter.limit("30 per minute")
+def predict_full():
+    """
+    Full-feature result for ?url=...&do_whois=...: cached or finished within FULL_WAIT
+    seconds -> 200, still running -> 202; computed here if nothing was started.
+    """
+    require_api_key()
+    _ensure_loaded()
+
+    if extract_kaggle_features is None:
+        return ojson({'error': 'Feature extractor not available on server (kaggle_features import failed)'}, 500)
+    if model is None:
+        return ojson({'error': 'Model not loaded'}, 500)
+
+    url = request.args.get('url', '') or ''
+    do_whois = request.args.get('do_whois', 'true').lower() not in ('0', 'false', 'no')
+    if not url:
+        return ojson({'error': 'No URL provided'}, 400)
 
-        prob = None
+    try:
+        cache_key = response_cache_key(url, do_whois)
+        response = cached_response(cache_key, url)
+        if response is not None:
+            return ojson(response, 200)
+
+        with _FULL_LOCK:
+            fut = _FULL_PENDING.get(cache_key)
+        if fut is None:
+            return ojson(full_prediction(url, do_whois, cache_key), 200)
         try:
-            proba_arr = model.predict_proba(df)
-            # find probability of predicted class
-            if hasattr(proba_arr, "shape"):
-                prob = float(proba_arr.max())
-            else:
-                # unexpected format; fallback
-                prob = None
-        except Exception:
-            # model doesn't support predict_proba or it failed
-            log("WARN: predict_proba not available or failed; continuing without confidence")
-            prob = None
+            return ojson({**fut.result(timeout=FULL_WAIT), 'url': url}, 200)
+        except TimeoutError:
+            return ojson({'status': 'pending'}, 202)
 
-        label = "Phishing" if pred == 1 else "Legitimate"
+    except Exception as e:
+        log_exception("ERROR in /predict/full")
+        return ojson({'error': str(e)}, 500)
 
-        # ---------------- Explain (if available) with fallback ----------------
-        contribs = []
-        # Try shap-based explanations first (if shap_utils.explain_instance is available)
-        if explain_instance:
-            try:
-                contribs = explain_instance(df) or []
-            except Exception:
-                log("WARN: explain_instance failed")
-                traceback.print_exc()
-                contribs = []
-
-        # Fallback: if SHAP not available or returned empty, try model.feature_importances_
-        if (not contribs or len(contribs) == 0) and hasattr(model, "feature_importances_"):
+# Bulk scans: at most MAX_BATCH_URLS per request, extracted concurrently so WHOIS/DNS
+# waits overlap, then scored with a single model call
+MAX_BATCH_URLS = int(os.getenv("MAX_BATCH_URLS", "50"))
+
+@app.route('/predict_batch', methods=['POST'])
+@limiter.limit("10 per minute")
+def predict_batch():
+    # enforce API key if configured
+    require_api_key()
+    _ensure_loaded()
+
+    # quick checks
+    if extract_kaggle_features is None:
+        return ojson({'error': 'Feature extractor not available on server (kaggle_features import failed)'}, 500)
+    if model is None:
+        return ojson({'error': 'Model not loaded'}, 500)
+    if not ROWS_BATCHED:
+        return ojson({'error': 'Batch prediction requires the expected feature columns'}, 500)
+
+    try:
+        data = request.get_json(force=True) or {}
+        if not isinstance(data, dict):
+            return ojson({'error': 'Request body must be a JSON object'}, 400)
+        urls = data.get('urls') or []
+        do_whois = data.get('do_whois', True)
+
+        if not isinstance(urls, list) or not urls:
+            return ojson({'error': 'No URLs provided'}, 400)
+        if len(urls) > MAX_BATCH_URLS:
+            return ojson({'error': f'Too many URLs (max {MAX_BATCH_URLS})'}, 400)
+
+        def _extract(url):
+            if not url:
+                return None, 'No URL provided'
+            if not isinstance(url, str):
+                return None, 'URL must be a string'
             try:
-                import numpy as np
-                cols = list(df.columns)
-                fi = getattr(model, "feature_importances_", None)
-                if fi is not None:
-                    fi = np.array(fi)
-                    # If feature_importances_ length matches columns, pair them
-                    if fi.shape[0] == len(cols):
-                        pairs = sorted(zip(cols, fi.tolist()), key=lambda x: abs(x[1]), reverse=True)
-                    else:
-                        # if sizes mismatch, try to use first-n
-                        pairs = sorted(zip(cols, fi[:len(cols)].tolist()), key=lambda x: abs(x[1]), reverse=True)
-                    contribs = [{"feature": name, "contribution": float(val)} for name, val in pairs[:12]]
-                    log("DEBUG: using feature_importances_ fallback for top_contributions")
-            except Exception:
-                log("WARN: feature_importances_ fallback failed")
-                traceback.print_exc()
-
-        # If still empty, contribs will be empty list (frontend will show "No contributions")
-
-        response = {
-            'url': url,
-            'prediction': label,
-            'confidence': round(prob, 3) if prob is not None else None,
-            'top_contributions': contribs[:6] if isinstance(contribs, list) else []
-        }
-        return jsonify(response), 200
+                return cached_features(url, do_whois)[0], None
+            except Exception as e:
+                return None, str(e)
+
+        with ThreadPoolExecutor(max_workers=min(32, len(urls))) as ex:
+            extracted = list(ex.map(_extract, urls))
+
+        # stack every successfully extracted row into one (N, F) array
+        ok = [i for i, (feats, _) in enumerate(extracted) if feats is not None]
+        X = np.zeros((len(ok), len(expected_cols)), dtype=np.float32)
+        for r, i in enumerate(ok):
+            X[r] = _feature_row(extracted[i][0])[0]
+        scores = dict(zip(ok, score_rows(X))) if ok else {}
+
+        results = []
+        for i, url in enumerate(urls):
+            if i in scores:
+                pred, prob = scores[i]
+                results.append({
+                    'url': url,
+                    'prediction': "Phishing" if pred == 1 else "Legitimate",
+                    'confidence': round(prob, 3) if prob is not None else None
+                })
+            else:
+                results.append({'url': url, 'error': extracted[i][1]})
+        return ojson({'results': results}, 200)
 
     except Exception as e:
-        log("ERROR in /predict:")
-        traceback.print_exc()
-        return jsonify({'error': str(e)}), 500
+        log_exception("ERROR in /predict_batch")
+        return ojson({'error': str(e)}, 500)
+
+@app.route('/explain/<token>', methods=['GET'])
+def explain(token):
+    """Return the background explanation for a /predict token (202 while pending)."""
+    require_api_key()
+
+    with _EXPLAIN_LOCK:
+        fut = _EXPLAIN_RESULTS.get(token)
+    if fut is None:
+        return ojson({'error': 'Unknown or expired explanation token'}, 404)
+    if not fut.done():
+        return ojson({'status': 'pending'}, 202)
+
+    try:
+        contribs = fut.result() or []
+    except Exception:
+        log_exception("WARN: explain_instance failed")
+        contribs = []
+    return ojson({
+        'status': 'done',
+        'top_contributions': contribs if isinstance(contribs, list) else []
+    }, 200)
 
 # ---------------- Run app ----------------
 if __name__ == '__main__':
     log("DEBUG: entering app.run()")
     try:
         port = int(os.getenv("PORT", "5000"))
-        # host 0.0.0.0 so Render / Gunicorn can bind correctly
-        app.run(host='0.0.0.0', port=port, debug=False)
+        # host 0.0.0.0 so Render / Gunicorn can bind correctly; threaded so requests
+        # waiting on WHOIS/DNS do not block each other
+        app.run(host='0.0.0.0', port=port, debug=False, threaded=True)
     except Exception:
-        log("ERROR running Flask:")
-        traceback.print_exc()
-
-@app.after_request
-def add_cors(response):
-    response.headers["Access-Control-Allow-Origin"] = FRONTEND_ORIGIN
-    response.headers["Access-Control-Allow-Headers"] = "Content-Type, x-api-key"
-    response.headers["Access-Control-Allow-Methods"] = "GET, POST, OPTIONS"
-    return response
+        log_exception("ERROR running Flask")
@@ -0,0 +1,66 @@
+# src/export_model.py
+"""
+Export the trained scikit-learn model to a faster serving format:
+  - ONNX (served through onnxruntime), requires skl2onnx for the export
+  - a treelite/tl2cgen compiled shared library with the forest as straight-line C,
+    requires treelite + tl2cgen and a C compiler
+The API prefers the compiled library, then ONNX, and falls back to the joblib model
+when neither file (or its runtime) is available.
+
+Usage: python export_model.py [onnx|treelite]   (default: onnx)
+"""
+
+import os
+import sys
+import joblib
+
+THIS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.abspath(os.path.join(THIS_DIR, ".."))
+MODEL_PATH = os.path.join(REPO_ROOT, "models", "phish_model_kaggle.pkl")
+ONNX_PATH = os.path.join(REPO_ROOT, "models", "phish_model_kaggle.onnx")
+TREELITE_LIB_PATH = os.path.join(REPO_ROOT, "models", "phish_model_kaggle.so")
+
+
+def export_onnx(model, n_features, onnx_path=ONNX_PATH):
+    """
+    Convert a fitted classifier to ONNX with a float32 input named 'input'.
+    Probabilities are emitted as a plain (N, n_classes) tensor (zipmap disabled).
+    """
+    from skl2onnx import convert_sklearn
+    from skl2onnx.common.data_types import FloatTensorType
+
+    initial_type = [('input', FloatTensorType([None, n_features]))]
+    onx = convert_sklearn(model, initial_types=initial_type,
+                          options={id(model): {'zipmap': False}})
+    with open(onnx_path, 'wb') as f:
+        f.write(onx.SerializeToString())
+    return onnx_path
+
+
+def export_treelite(model, libpath=TREELITE_LIB_PATH, toolchain='gcc', quantize=True):
+    """
+    Compile a fitted tree ensemble into a shared library specialized to this forest
+    and input width; load it with tl2cgen.Predictor.
+    quantize: replace the float threshold comparisons with comparisons of small integer
+    bin indices (each input is binned once per row), which shrinks the generated
+    node tests; predictions are unchanged.
+    """
+    import treelite
+    import tl2cgen
+
+    tl_model = treelite.sklearn.import_model(model)
+    tl2cgen.export_lib(tl_model, toolchain=toolchain, libpath=libpath,
+                       params={'parallel_comp': os.cpu_count() or 4,
+                               'quantize': 1 if quantize else 0})
+    return libpath
+
+
+if __name__ == "__main__":
+    target = sys.argv[1] if len(sys.argv) > 1 else "onnx"
+    model = joblib.load(MODEL_PATH)
+    if target == "treelite":
+        path = export_treelite(model)
+        print(f"💾 Compiled predictor saved to {path}")
+    else:
+        path = export_onnx(model, model.n_features_in_)
+        print(f"💾 ONNX model saved to {path}")
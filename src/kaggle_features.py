@@ -9,9 +9,15 @@ Use `do_whois=True` to enable WHOIS lookups (slower per-request).
 import re
 from urllib.parse import urlparse
 import tldextract
-import pandas as pd
 import socket
 import os
+import json
+import csv
+import asyncio
+import errno
+import threading
+from concurrent.futures import Future, wait
+from cachetools import TTLCache, TLRUCache
 
 # Try to import WHOIS and date parsing tools; allow graceful fallback
 try:
@@ -28,13 +34,66 @@ except Exception:
 import ssl
 import datetime as _datetime
 
+# One extractor for the process, using the public suffix list snapshot bundled with
+# tldextract: no fetch over the network and no on-disk cache read on first use
+_TLD_EXTRACT = tldextract.TLDExtract(suffix_list_urls=(), cache_dir=None)
+
 SHORTENERS = [
     "bit.ly","tinyurl.com","goo.gl","t.co","ow.ly","buff.ly","adf.ly","bitly.com",
     "is.gd","mcaf.ee","trib.al","shorturl.at","tiny.cc"
 ]
 
-# Simple in-memory cache for WHOIS lookups to avoid repeated network calls
-_WHOIS_CACHE = {}
+# Shortener hosts are matched with one Aho-Corasick pass over the host when
+# pyahocorasick is installed, otherwise with a substring check per shortener
+try:
+    import ahocorasick
+    _SHORTENER_AC = ahocorasick.Automaton()
+    for _s in SHORTENERS:
+        _SHORTENER_AC.add_word(_s, _s)
+    _SHORTENER_AC.make_automaton()
+    AHOCORASICK_AVAILABLE = True
+except Exception:
+    _SHORTENER_AC = None
+    AHOCORASICK_AVAILABLE = False
+
+_IP_RE = re.compile(r'^\d+\.\d+\.\d+\.\d+$')
+
+# In-memory cache for WHOIS lookups to avoid repeated network calls; shared by the
+# request threads, so every access goes through _WHOIS_LOCK
+_WHOIS_CACHE = TTLCache(maxsize=10_000, ttl=86400)
+_WHOIS_LOCK = threading.Lock()
+
+# Network failures (timeouts, refused connections, dead domains) are remembered for
+# FAIL_TTL seconds, so repeated requests for a dead domain return the 0 defaults at
+# once instead of waiting out the same timeouts again. Each failure is stored with
+# whether it was transient (see _is_transient), and extract_kaggle_features reports
+# transient ones as incomplete so callers do not keep their zeros beyond FAIL_TTL.
+FAIL_TTL = 300
+_WHOIS_FAIL_CACHE = TTLCache(maxsize=10_000, ttl=FAIL_TTL)
+
+_TRANSIENT_ERRNOS = {errno.ENETUNREACH, errno.EHOSTUNREACH, socket.EAI_AGAIN}
+
+def _is_transient(exc):
+    """
+    True for a failure that may go away on retry (timeout, dropped connection, network
+    or resolver unavailable), False for a definite answer (NXDOMAIN, no records, bad
+    certificate, no WHOIS record).
+    """
+    if DNS_AVAILABLE and isinstance(exc, (dns.exception.Timeout, dns.resolver.NoNameservers)):
+        return True
+    if isinstance(exc, ssl.SSLError):
+        return False
+    if isinstance(exc, (TimeoutError, ConnectionError)):
+        return True
+    return isinstance(exc, OSError) and exc.errno in _TRANSIENT_ERRNOS
+
+# WHOIS, SSL and the DNS lookups are independent network waits, so each extraction
+# runs them side by side: SSL on the calling thread, WHOIS on a thread of its own (only
+# when the domain is not in the WHOIS caches) and DNS on the event loop below. Every lookup is bounded by its own socket/DNS timeout;
+# LOOKUP_BACKSTOP only guards against one that ignores it, and an extraction that hits
+# it is reported as incomplete (see extract_kaggle_features(return_complete=True)).
+WHOIS_TIMEOUT = 10
+LOOKUP_BACKSTOP = 30.0
 
 # ---------------- WHOIS helpers ----------------
 def safe_parse_date(d):
@@ -60,22 +119,43 @@ def get_whois_dates_for_domain(domain):
     """
     Return (creation_date, expiration_date) as datetimes or (None, None) on failure.
     domain is a string like 'google.com' (no protocol).
-    Results cached in _WHOIS_CACHE for the session.
+    Results cached in _WHOIS_CACHE for a day, failed lookups in _WHOIS_FAIL_CACHE
+    for FAIL_TTL seconds.
     """
+    creation, expiration, _ = _whois_dates(domain)
+    return creation, expiration
+
+def _whois_cache_get(domain):
+    """Cached (creation, expiration, transient) for domain, recent failures included; None if unknown."""
+    with _WHOIS_LOCK:
+        cached = _WHOIS_CACHE.get(domain)
+        failed = _WHOIS_FAIL_CACHE.get(domain)
+    if cached is not None:
+        return (*cached, False)
+    if failed is not None:
+        return None, None, failed
+    return None
+
+def _whois_dates(domain):
+    """get_whois_dates_for_domain plus whether a failure was transient: (creation, expiration, transient)."""
     if not WHOIS_AVAILABLE:
-        return None, None
+        return None, None, False
 
     if not domain:
-        return None, None
+        return None, None, False
 
-    if domain in _WHOIS_CACHE:
-        return _WHOIS_CACHE[domain]
+    cached = _whois_cache_get(domain)
+    if cached is not None:
+        return cached
 
     try:
-        w = whois.whois(domain)
-    except Exception:
-        _WHOIS_CACHE[domain] = (None, None)
-        return None, None
+        # socket errors raise instead of being parsed as an empty (cacheable) record
+        w = whois.whois(domain, timeout=WHOIS_TIMEOUT, ignore_socket_errors=False)
+    except Exception as e:
+        transient = _is_transient(e)
+        with _WHOIS_LOCK:
+            _WHOIS_FAIL_CACHE[domain] = transient
+        return None, None, transient
 
     creation = None
     expiration = None
@@ -104,59 +184,183 @@ def get_whois_dates_for_domain(domain):
     except Exception:
         pass
 
-    _WHOIS_CACHE[domain] = (creation, expiration)
-    return creation, expiration
+    with _WHOIS_LOCK:
+        _WHOIS_CACHE[domain] = (creation, expiration)
+    return creation, expiration, False
 
 # ---------------- SSL helper ----------------
+# One client context for every handshake: building it loads and parses the system CA
+# bundle, which costs more than the handshake itself.
+_SSL_CTX = ssl.create_default_context()
+
+# Certificate expiry per domain; certificates rarely change within a day, so repeat
+# domains skip the TCP+TLS round trips. The expiry instant is cached, not the day
+# count, so the days are always computed against the current time.
+_SSL_EXPIRY_CACHE = TTLCache(maxsize=10_000, ttl=86400)
+_SSL_FAIL_CACHE = TTLCache(maxsize=10_000, ttl=FAIL_TTL)
+_SSL_LOCK = threading.Lock()
+
+def _fetch_ssl_expiry(domain, port, timeout):
+    """Handshake with domain:port and return the certificate's notAfter as naive UTC, or None."""
+    with socket.create_connection((domain, port), timeout=timeout) as sock:
+        with _SSL_CTX.wrap_socket(sock, server_hostname=domain) as ssock:
+            cert = ssock.getpeercert()
+            not_after = cert.get('notAfter')
+            if not not_after:
+                return None
+            # Example format: 'May  1 12:00:00 2026 GMT'
+            try:
+                return _datetime.datetime.strptime(not_after, '%b %d %H:%M:%S %Y %Z')
+            except Exception:
+                # fallback: try parsing without timezone name
+                try:
+                    return _datetime.datetime.strptime(not_after, '%b %d %H:%M:%S %Y')
+                except Exception:
+                    return None
+
 def get_ssl_expiry_days(domain, port=443, timeout=5):
     """
     Connect to domain:port, fetch SSL cert, return days until expiry (int).
     Returns 0 on any failure (no cert, timeout, connection error).
     """
+    return _ssl_expiry_days(domain, port, timeout)[0]
+
+def _ssl_expiry_days(domain, port=443, timeout=5):
+    """get_ssl_expiry_days plus whether a failure was transient: (days, transient)."""
     if not domain:
-        return 0
+        return 0, False
     try:
-        ctx = ssl.create_default_context()
-        with socket.create_connection((domain, port), timeout=timeout) as sock:
-            with ctx.wrap_socket(sock, server_hostname=domain) as ssock:
-                cert = ssock.getpeercert()
-                not_after = cert.get('notAfter')
-                if not not_after:
-                    return 0
-                # Example format: 'May  1 12:00:00 2026 GMT'
-                try:
-                    expiry = _datetime.datetime.strptime(not_after, '%b %d %H:%M:%S %Y %Z')
-                except Exception:
-                    # fallback: try parsing without timezone name
-                    try:
-                        expiry = _datetime.datetime.strptime(not_after, '%b %d %H:%M:%S %Y')
-                    except Exception:
-                        return 0
-                now = _datetime.datetime.utcnow()
-                delta = expiry - now
-                days = max(int(delta.total_seconds() // 86400), 0)
-                return days
+        key = (domain, port)
+        with _SSL_LOCK:
+            expiry = _SSL_EXPIRY_CACHE.get(key)
+            failed = _SSL_FAIL_CACHE.get(key)
+        if expiry is None:
+            if failed is not None:
+                return 0, failed
+            transient = False
+            try:
+                expiry = _fetch_ssl_expiry(domain, port, timeout)
+            except Exception as e:
+                expiry = None
+                transient = _is_transient(e)
+            with _SSL_LOCK:
+                if expiry is None:
+                    _SSL_FAIL_CACHE[key] = transient
+                else:
+                    _SSL_EXPIRY_CACHE[key] = expiry
+            if expiry is None:
+                return 0, transient
+        now = _datetime.datetime.utcnow()
+        delta = expiry - now
+        days = max(int(delta.total_seconds() // 86400), 0)
+        return days, False
     except Exception:
-        return 0
+        return 0, False
 
 # ----- DNS helpers (requires dnspython) -----
 try:
     import dns.resolver
+    import dns.asyncresolver
     DNS_AVAILABLE = True
 except Exception:
     DNS_AVAILABLE = False
 
+DNS_LIFETIME = 3.0
+DNS_COUNT_KEYS = (('qty_ip_resolved', 'A'), ('qty_nameservers', 'NS'), ('qty_mx_servers', 'MX'))
+
+# Answer counts per (name, rdtype), each kept for its record's own TTL
+_DNS_CACHE = TLRUCache(maxsize=10_000, ttu=lambda key, value, now: now + value[1])
+# failed queries (timeout, NXDOMAIN, no answer) count as 0 for FAIL_TTL seconds; the
+# value is whether the failure was transient
+_DNS_FAIL_CACHE = TTLCache(maxsize=10_000, ttl=FAIL_TTL)
+_DNS_LOCK = threading.Lock()
+
+# A, NS and MX queries run together on one event loop thread per process, which also
+# keeps a single async resolver (resolv.conf parsed once). Started lazily and again in
+# forked children.
+_DNS_LOOP = None
+_DNS_RESOLVER = None
+_DNS_PID = None
+_DNS_LOOP_LOCK = threading.Lock()
+
+def _dns_loop():
+    global _DNS_LOOP, _DNS_RESOLVER, _DNS_PID
+    if _DNS_PID != os.getpid():
+        with _DNS_LOOP_LOCK:
+            if _DNS_PID != os.getpid():
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="dns-loop", daemon=True).start()
+                _DNS_RESOLVER = dns.asyncresolver.Resolver()
+                _DNS_LOOP = loop
+                _DNS_PID = os.getpid()
+    return _DNS_LOOP
+
+def _dns_cache_get(name, rdtype):
+    """
+    Cached (answer count, transient) for (name, rdtype): (0, transient) for a recent
+    failure, None if unknown.
+    """
+    with _DNS_LOCK:
+        hit = _DNS_CACHE.get((name, rdtype))
+        if hit is None:
+            failed = _DNS_FAIL_CACHE.get((name, rdtype))
+            return None if failed is None else (0, failed)
+    return hit[0], False
+
+def _dns_cache_failure(name, rdtype, exc):
+    """Remember a failed query for FAIL_TTL; returns whether it was transient."""
+    transient = _is_transient(exc)
+    with _DNS_LOCK:
+        _DNS_FAIL_CACHE[(name, rdtype)] = transient
+    return transient
+
+async def _aresolve_count(name, rdtype):
+    """
+    (number of answers for name/rdtype, transient): (0, transient) on failure.
+    Successes are cached for their record TTL, failures for FAIL_TTL.
+    """
+    cached = _dns_cache_get(name, rdtype)
+    if cached is not None:
+        return cached
+    try:
+        answers = await _DNS_RESOLVER.resolve(name, rdtype, lifetime=DNS_LIFETIME)
+    except Exception as e:
+        return 0, _dns_cache_failure(name, rdtype, e)
+    count = len(answers)
+    with _DNS_LOCK:
+        _DNS_CACHE[(name, rdtype)] = (count, answers.rrset.ttl)
+    return count, False
+
+async def _dns_counts_async(domain):
+    results = await asyncio.gather(*(_aresolve_count(domain, rdtype) for _, rdtype in DNS_COUNT_KEYS))
+    counts = {key: count for (key, _), (count, _) in zip(DNS_COUNT_KEYS, results)}
+    return counts, any(transient for _, transient in results)
+
+def submit_dns_counts(domain):
+    """
+    Start the A/NS/MX lookups for domain on the DNS loop; returns a
+    concurrent.futures.Future resolving to (compute_dns_counts dict, transient), where
+    transient says a query timed out or found no working nameserver.
+    """
+    return asyncio.run_coroutine_threadsafe(_dns_counts_async(domain), _dns_loop())
+
 def safe_dns_query(name, rdtype):
     """
     Return number of answers for the given record type or 0 on failure.
     """
     if not DNS_AVAILABLE or not name:
         return 0
+    cached = _dns_cache_get(name, rdtype)
+    if cached is not None:
+        return cached[0]
     try:
-        answers = dns.resolver.resolve(name, rdtype, lifetime=3.0)
-        return len(answers)
-    except Exception:
+        answers = dns.resolver.resolve(name, rdtype, lifetime=DNS_LIFETIME)
+    except Exception as e:
+        _dns_cache_failure(name, rdtype, e)
         return 0
+    with _DNS_LOCK:
+        _DNS_CACHE[(name, rdtype)] = (len(answers), answers.rrset.ttl)
+    return len(answers)
 
 def compute_dns_counts(domain):
     """
@@ -169,9 +373,7 @@ def compute_dns_counts(domain):
     if not domain or not DNS_AVAILABLE:
         return out
     try:
-        out['qty_ip_resolved'] = safe_dns_query(domain, 'A')
-        out['qty_nameservers'] = safe_dns_query(domain, 'NS')
-        out['qty_mx_servers'] = safe_dns_query(domain, 'MX')
+        out.update(submit_dns_counts(domain).result(timeout=DNS_LIFETIME + 1)[0])
     except Exception:
         pass
     return out
@@ -183,9 +385,14 @@ def compute_domain_age_features(domain):
       - time_domain_activation : days since creation (int) or 0 if unknown
       - time_domain_expiration : days until expiration (int) or 0 if unknown/expired
     """
+    return _domain_age_features(domain)[0]
+
+def _domain_age_features(domain):
+    """compute_domain_age_features plus whether the WHOIS failure was transient: (dict, transient)."""
     out = {'time_domain_activation': 0, 'time_domain_expiration': 0}
+    transient = False
     try:
-        creation, expiration = get_whois_dates_for_domain(domain)
+        creation, expiration, transient = _whois_dates(domain)
         now = datetime.now(timezone.utc) if WHOIS_AVAILABLE else None
         if creation and now:
             # days since creation
@@ -198,22 +405,57 @@ def compute_domain_age_features(domain):
     except Exception:
         out['time_domain_activation'] = 0
         out['time_domain_expiration'] = 0
-    return out
+    return out, transient
+
+def submit_domain_age_features(domain):
+    """
+    Future resolving to (compute_domain_age_features dict, transient). A domain already
+    in the WHOIS caches is answered here; otherwise the lookup runs on a new thread.
+    """
+    fut = Future()
+    if _whois_cache_get(domain) is not None:
+        fut.set_result(_domain_age_features(domain))
+        return fut
+
+    def run():
+        try:
+            fut.set_result(_domain_age_features(domain))
+        except BaseException as e:
+            fut.set_exception(e)
+    threading.Thread(target=run, name="whois", daemon=True).start()
+    return fut
 
 # ---------------- basic helpers ----------------
 def count_char(s, ch):
     return s.count(ch) if s else 0
 
+_VOWELS = 'aeiouAEIOU'
+
+# characters counted over the whole URL -> qty_<name>_url
+URL_CHAR_FEATURES = [
+    ('dot', '.'), ('hyphen', '-'), ('underline', '_'), ('slash', '/'),
+    ('questionmark', '?'), ('equal', '='), ('at', '@'), ('and', '&'),
+    ('exclamation', '!'), ('space', ' '), ('tilde', '~'), ('comma', ','),
+    ('plus', '+'), ('asterisk', '*'), ('hashtag', '#'), ('dollar', '$'),
+    ('percent', '%'),
+]
+# feature keys built once; str.count per character beats a byte histogram on URL-length
+# strings (encode + bincount + per-key indexing cost more than 17 C-level scans)
+_URL_CHARS = [ch for _, ch in URL_CHAR_FEATURES]
+_URL_CHAR_KEYS = [f'qty_{name}_url' for name, _ in URL_CHAR_FEATURES]
+
 def has_ip(hostname):
     try:
-        return 1 if re.match(r'^\d+\.\d+\.\d+\.\d+$', hostname) else 0
+        return 1 if _IP_RE.match(hostname) else 0
     except:
         return 0
 
-def is_shortened(url):
+def is_shortened(url, parsed=None):
     try:
-        parsed = urlparse(url)
+        parsed = parsed if parsed is not None else urlparse(url)
         host = (parsed.netloc or "").lower()
+        if _SHORTENER_AC is not None:
+            return 1 if host and next(_SHORTENER_AC.iter(host), None) else 0
         for s in SHORTENERS:
             if s in host:
                 return 1
@@ -221,16 +463,17 @@ def is_shortened(url):
     except:
         return 0
 
-def get_domain(url):
+def get_domain(url, tld=None):
     """
     Return the registered domain (e.g. example.com) given a URL or hostname string.
+    tld: the url's _TLD_EXTRACT result, when the caller already has it
     """
     try:
         if not url:
             return ""
-        parsed = tldextract.extract(url)
-        domain = parsed.domain or ""
-        suffix = parsed.suffix or ""
+        tld = tld if tld is not None else _TLD_EXTRACT(url)
+        domain = tld.domain or ""
+        suffix = tld.suffix or ""
         registered = (domain + (("." + suffix) if suffix else ""))
         return registered
     except:
@@ -243,53 +486,41 @@ def safe_len(x):
         return 0
 
 # ---------------- lexical & domain feature extractors ----------------
-def extract_basic_lexical(url):
+def extract_basic_lexical(url, parsed=None, tld=None):
+    """
+    parsed / tld: urlparse and _TLD_EXTRACT results for the stripped url; computed
+    here when not passed in (extract_kaggle_features parses once and shares them)
+    """
     u = str(url).strip()
-    parsed = urlparse(u)
+    parsed = parsed if parsed is not None else urlparse(u)
+    tld = tld if tld is not None else _TLD_EXTRACT(u)
     hostname = parsed.hostname or ""
     path = parsed.path or ""
     query = parsed.query or ""
-    feats = {}
-    feats['qty_dot_url'] = count_char(u, '.')
-    feats['qty_hyphen_url'] = count_char(u, '-')
-    feats['qty_underline_url'] = count_char(u, '_')
-    feats['qty_slash_url'] = count_char(u, '/')
-    feats['qty_questionmark_url'] = count_char(u, '?')
-    feats['qty_equal_url'] = count_char(u, '=')
-    feats['qty_at_url'] = count_char(u, '@')
-    feats['qty_and_url'] = count_char(u, '&')
-    feats['qty_exclamation_url'] = count_char(u, '!')
-    feats['qty_space_url'] = count_char(u, ' ')
-    feats['qty_tilde_url'] = count_char(u, '~')
-    feats['qty_comma_url'] = count_char(u, ',')
-    feats['qty_plus_url'] = count_char(u, '+')
-    feats['qty_asterisk_url'] = count_char(u, '*')
-    feats['qty_hashtag_url'] = count_char(u, '#')
-    feats['qty_dollar_url'] = count_char(u, '$')
-    feats['qty_percent_url'] = count_char(u, '%')
-    feats['qty_tld_url'] = 1 if '.' in (tldextract.extract(u).suffix or "") else 0
+    feats = dict(zip(_URL_CHAR_KEYS, map(u.count, _URL_CHARS)))
+    feats['qty_tld_url'] = 1 if '.' in (tld.suffix or "") else 0
     feats['length_url'] = len(u)
     feats['email_in_url'] = 1 if re.search(r'mailto:|@', u) else 0
-    feats['url_shortened'] = is_shortened(u)
+    feats['url_shortened'] = is_shortened(u, parsed)
     feats['has_https'] = 1 if u.lower().startswith('https') else 0
     # path/dir/file/params counts (approx)
+    file_name = path.split('/')[-1]
     feats['qty_dot_directory'] = count_char(path, '.')
     feats['directory_length'] = safe_len(path)
-    feats['qty_dot_file'] = count_char(path.split('/')[-1], '.')
-    feats['file_length'] = safe_len(path.split('/')[-1])
+    feats['qty_dot_file'] = count_char(file_name, '.')
+    feats['file_length'] = safe_len(file_name)
     feats['qty_params'] = 1 if query else 0
     feats['params_length'] = safe_len(query)
     return feats, hostname
 
 def extract_domain_features_from_hostname(hostname):
-    parsed = tldextract.extract(hostname)
     feats = {}
     feats['qty_dot_domain'] = count_char(hostname, '.')
     feats['qty_hyphen_domain'] = count_char(hostname, '-')
     feats['qty_underline_domain'] = count_char(hostname, '_')
     feats['domain_length'] = len(hostname)
     feats['domain_in_ip'] = has_ip(hostname)
-    feats['qty_vowels_domain'] = sum(1 for ch in hostname if ch.lower() in 'aeiou')
+    feats['qty_vowels_domain'] = sum(map(hostname.count, _VOWELS))
     return feats
 
 # ---------------- heavy defaults ----------------
@@ -311,15 +542,27 @@ def heavy_defaults():
     }
 
 # ---------------- main extractor ----------------
-def extract_kaggle_features(url, expected_columns=None, do_whois=False):
+def extract_kaggle_features(url, expected_columns=None, do_whois=False, do_network=True,
+                            return_complete=False):
     """
     url: raw URL string
     expected_columns: list of column names the Kaggle model expects (so we keep same order)
     do_whois: (optional) try to fill WHOIS fields (may be slow)
-    returns: ordered dict (Python dict with keys of expected_columns)
+    do_network: False skips SSL/DNS/WHOIS entirely (lexical + domain features only,
+        heavy features keep their 0 defaults)
+    return_complete: also return whether every network lookup gave a definite answer
+        (False when one was abandoned at LOOKUP_BACKSTOP or failed transiently, e.g. a
+        timeout, so callers should not cache the result)
+    returns: ordered dict (Python dict with keys of expected_columns),
+        or (dict, complete) with return_complete=True
     """
+    # parse once; every helper below reuses these
+    u = str(url).strip()
+    parsed = urlparse(u)
+    tld = _TLD_EXTRACT(u)
+
     base_feats = {}
-    lexical_feats, hostname = extract_basic_lexical(url)
+    lexical_feats, hostname = extract_basic_lexical(u, parsed, tld)
     domain_feats = extract_domain_features_from_hostname(hostname)
     base_feats.update(lexical_feats)
     base_feats.update(domain_feats)
@@ -327,33 +570,32 @@ def extract_kaggle_features(url, expected_columns=None, do_whois=False):
     # start with safe defaults for heavy features
     base_feats.update(heavy_defaults())
 
-    # WHOIS features (optional)
-    registered_domain = get_domain(url)
-    if do_whois and WHOIS_AVAILABLE and registered_domain:
-        try:
-            whois_feats = compute_domain_age_features(registered_domain)
-            # merge whois values into base
-            base_feats.update(whois_feats)
-        except Exception:
-            pass
-
-    # SSL/TLS certificate feature: days until expiry (0 if no cert/failure)
-    try:
-        ssl_days = get_ssl_expiry_days(registered_domain)
-        base_feats['tls_ssl_certificate'] = ssl_days
-    except Exception:
-        base_feats['tls_ssl_certificate'] = base_feats.get('tls_ssl_certificate', 0)
-
-    # DNS counts (fast) — improves classifier
-    try:
-        dns_feats = compute_dns_counts(registered_domain)
-        base_feats.update(dns_feats)
-    except Exception:
-        pass
+    # WHOIS (optional), SSL expiry and DNS counts are fetched concurrently; each
+    # lookup returns its 0 defaults on failure plus whether that failure was transient
+    complete = True
+    registered_domain = get_domain(u, tld)
+    if registered_domain and do_network:
+        futures = {}
+        if do_whois and WHOIS_AVAILABLE:
+            futures['whois'] = submit_domain_age_features(registered_domain)
+        if DNS_AVAILABLE:
+            futures['dns'] = submit_dns_counts(registered_domain)
+        # SSL runs here while WHOIS and DNS are in flight
+        base_feats['tls_ssl_certificate'], ssl_transient = _ssl_expiry_days(registered_domain)
+        done, pending = wait(futures.values(), timeout=LOOKUP_BACKSTOP)
+        complete = not pending and not ssl_transient
+        for fut in done:
+            try:
+                feats, transient = fut.result()
+            except Exception:
+                complete = False
+                continue
+            base_feats.update(feats)
+            complete = complete and not transient
 
     # if expected_columns provided, ensure all keys present (fill with 0 by default)
     if expected_columns is None:
-        return base_feats
+        return (base_feats, complete) if return_complete else base_feats
 
     out = {}
     for col in expected_columns:
@@ -363,21 +605,40 @@ def extract_kaggle_features(url, expected_columns=None, do_whois=False):
         else:
             # fallback heuristics: always use 0 as neutral default
             out[key] = 0
-    return out
+    return (out, complete) if return_complete else out
 
 # ---------------- utility to load columns ----------------
 def load_kaggle_columns(kaggle_csv_path):
     """
     Read header of kaggle CSV and return list of feature columns (exclude label column)
     """
-    df = pd.read_csv(kaggle_csv_path, nrows=1, encoding='utf-8-sig')
-    cols = list(df.columns)
+    # only the header line is needed; utf-8-sig drops a leading BOM like pandas did
+    with open(kaggle_csv_path, encoding='utf-8-sig', newline='') as f:
+        cols = next(csv.reader(f), [])
     # find label column (common names)
     label_candidates = [c for c in cols if any(x in c.lower() for x in ['label','phish','result','class','status'])]
     label_col = label_candidates[0] if label_candidates else None
     feature_cols = [c for c in cols if c != label_col]
     return feature_cols, label_col
 
+def save_kaggle_columns(kaggle_csv_path, out_path):
+    """
+    Write the (feature_cols, label_col) pair derived from the CSV header to a small JSON
+    file so the API can start without touching the multi-MB dataset.
+    """
+    feature_cols, label_col = load_kaggle_columns(kaggle_csv_path)
+    with open(out_path, 'w', encoding='utf-8') as f:
+        json.dump({'feature_cols': feature_cols, 'label_col': label_col}, f, indent=1)
+    return feature_cols, label_col
+
+def load_saved_columns(path):
+    """
+    Read columns written by save_kaggle_columns; returns (feature_cols, label_col).
+    """
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    return list(data['feature_cols']), data.get('label_col')
+
 # ---------------- quick test when run directly ----------------
 if __name__ == "__main__":
     cols, label = load_kaggle_columns("../data/raw/kaggle_phish.csv")
@@ -0,0 +1,93 @@
+# src/micro_batch.py
+"""
+Request coalescer for single-row model calls.
+Concurrent callers park their feature row on a queue; a background thread waits a few
+milliseconds for more rows (unless no other caller is about to enqueue one), stacks
+them into one (N, F) array and runs a single model call, then hands each caller its
+own result. This amortizes the fixed per-call cost of sklearn/ONNX predict across
+requests arriving together.
+"""
+
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+
+class MicroBatcher:
+    def __init__(self, predict_fn, max_batch=64, max_wait=0.005):
+        """
+        predict_fn: callable taking an (N, F) array and returning N per-row results
+        max_batch: most rows stacked into one predict_fn call
+        max_wait: seconds to wait for more rows after the first one arrives, as long as
+            another caller is between submit() and the queue
+        """
+        self.predict_fn = predict_fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._pid = None
+
+    def _ensure_worker(self):
+        # started lazily and re-started in forked children (threads do not survive fork)
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = queue.Queue()
+            self._pending = 0
+            t = threading.Thread(target=self._run, args=(self._queue,), daemon=True)
+            t.start()
+            self._pid = os.getpid()
+
+    def submit(self, row, timeout=1.0):
+        """
+        Score one 1-D feature row. Blocks until the batch containing it is done.
+        Raises TimeoutError if no result arrives within `timeout` seconds.
+        """
+        self._ensure_worker()
+        fut = Future()
+        # counted before the put, so the drain loop knows another row is on its way
+        with self._lock:
+            self._pending += 1
+        self._queue.put((row, fut))
+        return fut.result(timeout=timeout)
+
+    def _take(self, item):
+        with self._lock:
+            self._pending -= 1
+        return item
+
+    def _drain(self, q):
+        items = [self._take(q.get())]
+        deadline = time.monotonic() + self.max_wait
+        while len(items) < self.max_batch:
+            if self._pending == 0:
+                # nobody else is submitting: waiting would only delay this batch
+                break
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                items.append(self._take(q.get(timeout=remaining)))
+            except queue.Empty:
+                break
+        return items
+
+    def _run(self, q):
+        while True:
+            items = self._drain(q)
+            try:
+                results = self.predict_fn(np.vstack([row for row, _ in items]))
+                for (_, fut), res in zip(items, results):
+                    fut.set_result(res)
+            except Exception as e:
+                for _, fut in items:
+                    if not fut.done():
+                        fut.set_exception(e)
@@ -0,0 +1,30 @@
+# src/row_kernels.py
+"""
+Numba kernels for the per-request feature row (plain NumPy fallbacks when numba is
+not installed). Kept in their own side-effect-free module: numba's on-disk cache
+re-imports the defining module by name when it loads a compiled function, which
+would otherwise re-run the whole API startup.
+"""
+
+import numpy as np
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except Exception:
+    NUMBA_AVAILABLE = False
+
+if NUMBA_AVAILABLE:
+    # no fastmath: it assumes NaN never occurs and would fold away the v != v check
+    @njit(cache=True)
+    def sanitize_row(row):
+        """In place: NaN and -1 both mean "unknown" -> neutral 0."""
+        for i in range(row.shape[0]):
+            v = row[i]
+            if v != v or v == -1.0:
+                row[i] = 0.0
+else:
+    def sanitize_row(row):
+        """In place: NaN and -1 both mean "unknown" -> neutral 0."""
+        np.nan_to_num(row, copy=False, nan=0.0)
+        row[row == -1] = 0
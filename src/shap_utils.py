@@ -1,13 +1,18 @@
 # src/shap_utils.py
 """
-Explain instance(df) -> list of {feature, contribution}.
+Explain instance(df or row) -> list of {feature, contribution}.
 Tries SHAP first; if unavailable or fails, falls back to model.feature_importances_ * normalized feature values.
 """
 
+import os
+import threading
 import joblib
 import numpy as np
 
-MODEL_PATH = "../models/phish_model_kaggle.pkl"
+# Same resolution as api.py: MODEL_PATH env var, else models/ under the repo root
+# (independent of the working directory)
+THIS_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_PATH = os.path.abspath(os.getenv("MODEL_PATH") or os.path.join(THIS_DIR, "..", "models", "phish_model_kaggle.pkl"))
 
 # detect shap availability
 try:
@@ -16,18 +21,62 @@ try:
 except Exception:
     SHAP_AVAILABLE = False
 
+# The API registers the model it already loaded (set_model); joblib is only used when
+# explain_instance is called standalone. The TreeExplainer walks every tree when it is
+# built, so it is built once per model and reused.
 _model = None
+_explainer = None
+_LOCK = threading.Lock()
+
+def set_model(model):
+    """Use an already-loaded model for explanations and build its explainer now."""
+    global _model, _explainer
+    with _LOCK:
+        _model = model
+        _explainer = None
+    if SHAP_AVAILABLE:
+        try:
+            _get_explainer()
+        except Exception:
+            pass
+
 def _load_model():
     global _model
     if _model is None:
-        _model = joblib.load(MODEL_PATH)
+        with _LOCK:
+            if _model is None:
+                _model = joblib.load(MODEL_PATH)
     return _model
 
-def explain_instance(df, top_k=6):
+def _get_explainer():
+    global _explainer
+    if _explainer is None:
+        model = _load_model()
+        with _LOCK:
+            if _explainer is None:
+                _explainer = shap.TreeExplainer(model)
+    return _explainer
+
+def _top_contributions(features, vals, top_k):
+    """
+    Top-k {feature, contribution} dicts by absolute value, sorted desc.
+    argpartition selects the k largest in O(n); only those k are sorted.
+    """
+    vals = np.asarray(vals, dtype=float).ravel()
+    k = min(top_k, len(vals))
+    if k <= 0:
+        return []
+    mags = np.abs(vals)
+    idx = np.argpartition(-mags, k - 1)[:k]
+    idx = idx[np.argsort(-mags[idx], kind="stable")]
+    return [{"feature": features[i], "contribution": float(vals[i])} for i in idx]
+
+def explain_instance(df, top_k=6, feature_names=None):
     """
-    df: pandas.DataFrame with a single row
+    df: pandas.DataFrame with a single row, or a (1, F) numpy array plus feature_names
     returns: list of {"feature": name, "contribution": float} sorted by absolute contribution desc.
     """
+    features = list(feature_names) if feature_names is not None else df.columns.tolist()
     try:
         model = _load_model()
     except Exception:
@@ -36,18 +85,17 @@ def explain_instance(df, top_k=6):
     # Try SHAP first (best)
     if SHAP_AVAILABLE:
         try:
-            explainer = shap.TreeExplainer(model)
-            shap_vals = explainer.shap_values(df)
+            shap_vals = _get_explainer().shap_values(df)
             # if binary classifier, pick class 1 contributions
             if isinstance(shap_vals, list) and len(shap_vals) >= 2:
                 vals = shap_vals[1][0]
+            elif getattr(shap_vals, "ndim", 0) == 3:
+                # newer shap returns one (rows, features, classes) array
+                vals = shap_vals[0, :, -1]
             else:
                 # regression or other -> take first row
                 vals = shap_vals[0] if isinstance(shap_vals, (list, tuple)) else shap_vals[0]
-            features = df.columns.tolist()
-            contribs = [{"feature": f, "contribution": float(v)} for f, v in zip(features, vals)]
-            contribs_sorted = sorted(contribs, key=lambda x: abs(x["contribution"]), reverse=True)[:top_k]
-            return contribs_sorted
+            return _top_contributions(features, vals, top_k)
         except Exception:
             # fall through to fallback
             pass
@@ -61,14 +109,11 @@ def explain_instance(df, top_k=6):
         else:
             fi = None
 
-        features = df.columns.tolist()
-        vals = df.iloc[0].astype(float).values
+        # the API passes its float32 row; a DataFrame is read straight into NumPy too
+        vals = np.asarray(df if isinstance(df, np.ndarray) else df.to_numpy(), dtype=float)[0]
         if fi is not None and len(fi) == len(vals):
-            norm_vals = vals / (1.0 + np.abs(vals))
-            raw = fi * norm_vals
-            contribs = [{"feature": f, "contribution": float(r)} for f, r in zip(features, raw)]
-            contribs_sorted = sorted(contribs, key=lambda x: abs(x["contribution"]), reverse=True)[:top_k]
-            return contribs_sorted
+            raw = fi * (vals / (1.0 + np.abs(vals)))
+            return _top_contributions(features, raw, top_k)
     except Exception:
         pass
 
@@ -4,10 +4,14 @@ from sklearn.model_selection import train_test_split
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.metrics import classification_report, confusion_matrix, accuracy_score
 import joblib
+from kaggle_features import save_kaggle_columns
+from export_model import export_onnx
 
 # === Paths ===
 DATA_PATH = "../data/raw/kaggle_phish.csv"
 MODEL_PATH = "../models/phish_model_kaggle.pkl"
+COLUMNS_PATH = "../models/expected_cols.json"
+ONNX_PATH = "../models/phish_model_kaggle.onnx"
 
 print("📂 Loading dataset...")
 df = pd.read_csv(DATA_PATH, encoding="utf-8-sig")
@@ -28,8 +32,9 @@ print(f"✅ Detected label column: {label_col}")
 X = df.drop(columns=[label_col])
 y = df[label_col]
 
-# Handle missing values
-X = X.fillna(0)
+# Handle missing values; train on float32, the dtype the trees split on internally and
+# the API's feature row / ONNX / compiled predictor inputs use
+X = X.fillna(0).astype("float32")
 
 # Split data
 X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
@@ -46,6 +51,17 @@ print(classification_report(y_test, y_pred))
 print("Confusion Matrix:\n", confusion_matrix(y_test, y_pred))
 print(f"✅ Accuracy: {accuracy_score(y_test, y_pred):.4f}")
 
-# Save model
-joblib.dump(model, MODEL_PATH)
+# Save model (uncompressed so the API can load it with mmap_mode='r')
+joblib.dump(model, MODEL_PATH, compress=0)
 print(f"\n💾 Model saved to {MODEL_PATH}")
+
+# Save the column list so the API does not need to parse the CSV at startup
+save_kaggle_columns(DATA_PATH, COLUMNS_PATH)
+print(f"💾 Feature columns saved to {COLUMNS_PATH}")
+
+# Export to ONNX so the API serves through onnxruntime (optional: needs skl2onnx)
+try:
+    export_onnx(model, X.shape[1], ONNX_PATH)
+    print(f"💾 ONNX model saved to {ONNX_PATH}")
+except ImportError:
+    print("⚠️ skl2onnx not installed; skipping ONNX export (API will use the joblib model)")